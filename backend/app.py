@@ -1,61 +1,97 @@
 import os
-from flask import Flask, jsonify, request, send_from_directory
+from pathlib import Path
+from flask import Flask, Response, request, send_from_directory
 from flask_cors import CORS
-from dotenv import load_dotenv 
+from dotenv import load_dotenv
 
 # Import the configuration settings
-from . import config 
+from . import config
 
-# MongoDB setup and utility functions
-from .services import db_service # Relative import
 
-# User-related routes (modularized via blueprint)
-from .routes.user_routes import user_bp # Relative import
-# Game-related routes
-from .routes.game_routes import game_bp # Relative import
-
-
-# --- 1. Load Config and Init Database ---
+# --- 1. Load Config ---
 
 # Load environment variables (from .env)
-load_dotenv() 
-
-# --- 2. Create and Configure Flask App (Directly) ---
-
-# NEW FIX: Remove the create_app() function and define the 'app' object directly.
-app = Flask(
-    __name__, 
-    static_folder="../frontend", 
-    static_url_path="/"
-)
-
-# Pull in settings from config.py
-app.config.from_object(config)
-
-# Allow frontend to talk to backend (CORS setup)
-CORS(app)
-
-# Connect to MongoDB and set up TTL index for cleanup
-db_service.init_db()
-
-# --- 3. Register Blueprints ---
-
-app.register_blueprint(user_bp, url_prefix='/api/user')
-app.register_blueprint(game_bp, url_prefix='/api/game')
-
-
-# --- 4. Define Routes ---
-
-@app.route("/api/status", methods=["GET"])
-def get_status():
-    """Quick ping to verify API is up."""
-    return jsonify({"status": "API is online! 🚀"})
-
-@app.route("/")
-def serve_frontend():
-    """Delivers the main frontend HTML file."""
-    return send_from_directory(app.static_folder, "index.html")
-
-# --- 5. Run the App Locally (No change to this block) ---
+load_dotenv()
+
+# The status payload never changes, so it is encoded once instead of per request
+_STATUS_BODY = '{"status": "API is online! 🚀"}'.encode('utf-8')
+
+# --- 2. Application Factory ---
+# Blueprints, extensions and the database layer are imported inside create_app()
+# so importing this module stays cheap (no PyMongo import or connection at import time).
+
+def create_app(test_config=None):
+    """
+    Builds and configures the Flask app.
+
+    Args:
+        test_config (dict, optional): settings that override config.py, e.g. {"TESTING": True}
+            to skip connecting to MongoDB.
+    """
+    app = Flask(
+        __name__,
+        static_folder="../frontend",
+        static_url_path="/"
+    )
+
+    # Use orjson for all JSON encoding/decoding
+    from .json_provider import OrjsonProvider
+    app.json_provider_class = OrjsonProvider
+    app.json = OrjsonProvider(app)
+
+    # Pull in settings from config.py
+    app.config.from_object(config)
+    if test_config:
+        app.config.update(test_config)
+
+    # Allow frontend to talk to backend (CORS setup)
+    CORS(app)
+
+    # Response cache for read-heavy routes (backend chosen by CACHE_TYPE)
+    from .extensions import cache
+    cache.init_app(app)
+
+    # Connect to MongoDB and set up indexes (skipped under tests)
+    if not app.config.get("TESTING"):
+        from .services import db_service
+        with app.app_context():
+            db_service.init_db()
+
+    # --- 3. Register Blueprints ---
+
+    # User-related routes (modularized via blueprint)
+    from .routes.user_routes import user_bp
+    # Game-related routes
+    from .routes.game_routes import game_bp
+
+    app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(game_bp, url_prefix='/api/game')
+
+
+    # --- 4. Define Routes ---
+
+    @app.route("/api/status", methods=["GET"])
+    def get_status():
+        """Quick ping to verify API is up."""
+        return Response(_STATUS_BODY, mimetype="application/json")
+
+    # The SPA entry point never changes while the process runs, so read it once
+    index_html = Path(app.static_folder, "index.html").read_bytes()
+
+    @app.route("/")
+    def serve_frontend():
+        """Delivers the main frontend HTML file."""
+        # In debug mode read from disk each time so edits show up without a restart
+        if app.debug:
+            return send_from_directory(app.static_folder, "index.html")
+        return Response(
+            index_html,
+            mimetype="text/html",
+            headers={"Cache-Control": "public, max-age=300"}
+        )
+
+    return app
+
+# --- 5. Run the App Locally ---
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,11 @@
+# One-off migration: run with `python -m backend.backfill_usernames` from the repo root.
+# Copies username/is_guest from Users onto Game_History records saved before the
+# leaderboard stopped joining against Users. Safe to run more than once.
+
+from .services import db_service
+
+
+if __name__ == "__main__":
+    db_service.init_db()
+    remaining = db_service.backfill_game_history_usernames()
+    print(f"Backfill complete. {remaining} game record(s) still have no username (their user no longer exists).")
\ No newline at end of file
@@ -10,6 +10,28 @@ SECRET_KEY = os.environ.get("SECRET_KEY", "fallback_secret_key_for_dev_only")
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = os.environ.get("DB_NAME", "Guess_Game")
 
+# Connection pool tuning (one MongoClient per process shares this pool across requests)
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 200))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 10))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 300000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+
 # 3. GAME SETTINGS
 # Note: os.environ.get returns a string, so we convert it to an integer.
-GUEST_TTL_SECONDS = int(os.environ.get("GUEST_TTL_SECONDS", 3600))
\ No newline at end of file
+GUEST_TTL_SECONDS = int(os.environ.get("GUEST_TTL_SECONDS", 3600))
+
+# bcrypt work factor: each +1 doubles hashing time (12 is roughly 200ms per hash)
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+
+# Unfinished games are discarded this many seconds after they were started.
+GAME_TTL_SECONDS = int(os.environ.get("GAME_TTL_SECONDS", 3600))
+
+# 4. CACHE SETTINGS
+# Production (the Procfile runs 4 gunicorn workers): set CACHE_REDIS_URL so all workers
+# share one RedisCache and a leaderboard refresh after a win reaches every worker.
+# Without it each worker falls back to its own SimpleCache, and the other workers
+# keep serving their copy until LEADERBOARD_CACHE_SECONDS expires.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+CACHE_TYPE = os.environ.get("CACHE_TYPE", "RedisCache" if CACHE_REDIS_URL else "SimpleCache")
+# The leaderboard may be served this many seconds stale.
+LEADERBOARD_CACHE_SECONDS = int(os.environ.get("LEADERBOARD_CACHE_SECONDS", 10))
\ No newline at end of file
@@ -0,0 +1,5 @@
+from flask_caching import Cache
+
+# Shared Flask extension instances, bound to the app inside app.py.
+# Kept in their own module so blueprints can import them without circular imports.
+cache = Cache()
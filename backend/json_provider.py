@@ -0,0 +1,23 @@
+import orjson
+from bson.objectid import ObjectId
+from flask.json.provider import JSONProvider
+
+
+def _default(obj):
+    """Serializes types orjson does not handle natively (MongoDB ObjectIds)."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider backed by orjson, used by jsonify() and request.get_json().
+    Datetimes are emitted as ISO 8601; naive ones (as returned by PyMongo) are treated as UTC.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NAIVE_UTC).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
\ No newline at end of file
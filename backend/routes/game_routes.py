@@ -1,16 +1,39 @@
 # backend/routes/game_routes.py
 
-from flask import Blueprint, request, jsonify, session
-import random
+from flask import Blueprint, request, jsonify, session, current_app
 from ..services import db_service
+from ..extensions import cache
 
 # Create a Blueprint instance for game-related routes
 game_bp = Blueprint('game_bp', __name__)
 
-# --- SERVER-SIDE GAME STATE (Temporary in-memory storage) ---
-# This dictionary will hold the secret number and attempts for each active user.
-# The key will be the user's ID.
-active_games = {}
+# --- SERVER-SIDE GAME STATE ---
+# Active games are stored in MongoDB (ActiveGames collection, keyed by user ID)
+# so that every worker process sees the same state.
+
+# --- LEADERBOARD CACHE ---
+LEADERBOARD_SIZE = 10
+LEADERBOARD_CACHE_KEY = 'leaderboard_top10'
+
+def _cache_leaderboard(leaderboard):
+    """Stores the leaderboard for LEADERBOARD_CACHE_SECONDS."""
+    cache.set(
+        LEADERBOARD_CACHE_KEY,
+        leaderboard,
+        timeout=current_app.config['LEADERBOARD_CACHE_SECONDS']
+    )
+
+def _refresh_leaderboard_if_beaten(attempts):
+    """
+    Rebuilds the cached leaderboard only if a new score would appear on it.
+    The refill reads from the primary: a lagging secondary could still return
+    the board without the new score and put it back in the cache.
+    """
+    cached = cache.get(LEADERBOARD_CACHE_KEY)
+    if cached is None:
+        return
+    if len(cached) < LEADERBOARD_SIZE or attempts < cached[-1]['attempts_taken']:
+        _cache_leaderboard(db_service.get_leaderboard(limit=LEADERBOARD_SIZE, read_primary=True))
 
 @game_bp.route('/start', methods=['POST'])
 def start_game():
@@ -34,18 +57,31 @@ def start_game():
             "message": "Invalid range. Max range must be a whole number between 10 and 100."
         }), 400
 
-    # 2. Game Logic: Generate secret number
-    secret_number = random.randint(min_range, max_range)
+    # Look up the player once; the name is carried with the game into the history record
+    try:
+        user = db_service.find_user_by_id(user_id)
+    except Exception as e:
+        print(f"Error looking up user {user_id}: {e}")
+        return jsonify({"message": "Could not start a new game. Please try again."}), 500
+
+    if user is None:
+        return jsonify({"message": "User not found. Please log in again."}), 401
 
-    # 3. State Management: Store the game state
-    active_games[user_id] = {
-        'secret_number': secret_number,
-        'attempts': 0,
-        'min_range': min_range, # Stored as 1
-        'max_range': max_range
-    }
+    # 2. Game Logic + State Management: the secret number is generated and stored
+    #    in a single database write (replaces any unfinished game)
+    try:
+        db_service.start_active_game(
+            user_id,
+            user.get('username'),
+            user.get('is_guest', False),
+            min_range,
+            max_range
+        )
+    except Exception as e:
+        print(f"Error starting game for user {user_id}: {e}")
+        return jsonify({"message": "Could not start a new game. Please try again."}), 500
 
-    # 4. Response
+    # 3. Response
     return jsonify({
         "message": f"New game started. Guess a number between 1 and {max_range}.",
         "range": f"1-{max_range}"
@@ -62,39 +98,59 @@ def handle_guess():
     if not user_id or guess is None:
         return jsonify({"message": "User ID and guess are required."}), 400
 
-    # 2. Check Active Game State (MUST EXIST)
-    if user_id not in active_games:
+    if not db_service.is_valid_user_id(user_id):
+        return jsonify({"message": "Invalid user ID."}), 400
+
+    # 2. Retrieve Game State and Update Attempts in one atomic step (MUST EXIST)
+    try:
+        game_state = db_service.record_guess(user_id)
+    except Exception as e:
+        print(f"Error recording guess for user {user_id}: {e}")
+        return jsonify({"message": "Could not process your guess. Please try again."}), 500
+
+    if game_state is None:
         return jsonify({"message": "No active game found. Please start a new game."}), 404
 
-    # 3. Retrieve Game State and Update Attempts (U in CRUD logic for state)
-    game_state = active_games[user_id]
-    game_state['attempts'] += 1
-    
     secret = game_state['secret_number']
     
-    # 4. Compare Guess
+    # 3. Compare Guess
     if guess == secret:
-        # WIN CONDITION: Game is over
-        score = game_state['attempts']
+        # WIN CONDITION: Game is over. Claim (remove) the game atomically so that
+        # concurrent winning guesses cannot save the same game twice.
+        try:
+            won_game = db_service.claim_won_game(user_id, game_state['started_at'])
+        except Exception as e:
+            print(f"Error finishing game for user {user_id}: {e}")
+            return jsonify({"message": "Could not process your guess. Please try again."}), 500
+
+        if won_game is None:
+            return jsonify({"message": "This game has already ended. Please start a new game."}), 409
+
+        score = won_game['attempts']
         
         # --- NEW CODE: Save the score to MongoDB ---
         try:
             db_service.save_game_history(
                 user_id, 
+                won_game['username'],
+                won_game['is_guest'],
                 score, 
-                game_state['min_range'], 
-                game_state['max_range'], 
-                game_state['secret_number']
+                won_game['min_range'], 
+                won_game['max_range'], 
+                won_game['secret_number']
             )
             message = f"Correct! Score saved successfully in {score} attempts."
         except Exception as e:
-            # Handle potential database error, but still clear the game state
+            # Handle potential database error (the game state is already cleared)
             print(f"Error saving game history for user {user_id}: {e}")
             message = f"Correct! You won in {score} attempts, but score could not be saved."
+        else:
+            # The score is saved; a cache failure must not change the reply
+            try:
+                _refresh_leaderboard_if_beaten(score)
+            except Exception as e:
+                print(f"Error refreshing leaderboard cache: {e}")
 
-
-        del active_games[user_id] # Clear state
-        
         return jsonify({
             "message": message,
             "status": "won",
@@ -106,7 +162,7 @@ def handle_guess():
     else: # guess > secret
         result = "try lower"
         
-    # 5. Response for ongoing game
+    # 4. Response for ongoing game
     return jsonify({
         "message": result,
         "attempts": game_state['attempts'],
@@ -119,9 +175,21 @@ def handle_guess():
 def get_leaderboard_route():
     """Retrieves and returns the top 10 scores using the Aggregation Pipeline."""
     
+    # Serve from cache when possible; the leaderboard tolerates a few seconds of staleness.
+    # The cache is only an optimization, so if it is unavailable read MongoDB directly.
+    try:
+        leaderboard = cache.get(LEADERBOARD_CACHE_KEY)
+    except Exception as e:
+        print(f"Error reading leaderboard cache: {e}")
+        leaderboard = None
+
     try:
-        # Call the new function from db_service
-        leaderboard = db_service.get_leaderboard(limit=10)
+        if leaderboard is None:
+            leaderboard = db_service.get_leaderboard(limit=LEADERBOARD_SIZE)
+            try:
+                _cache_leaderboard(leaderboard)
+            except Exception as e:
+                print(f"Error writing leaderboard cache: {e}")
         
         return jsonify(leaderboard), 200
         
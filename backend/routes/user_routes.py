@@ -1,17 +1,64 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from concurrent.futures import ThreadPoolExecutor
 from ..services import db_service
 import bcrypt
-import random
+import os
+from pymongo.errors import DuplicateKeyError
 import string
 
 # Blueprint for user-related routes
 user_bp = Blueprint('user_bp', __name__)
 
+# Only the fields the login check needs are fetched from the Users collection
+LOGIN_PROJECTION = {"_id": 1, "username": 1, "is_guest": 1, "password_hash": 1}
+
+# bcrypt runs in C and releases the GIL, so hashing on a small dedicated pool
+# keeps the request worker (and other gthread/gevent requests) from stalling on it.
+# Under gevent, threading is monkey-patched (threads become greenlets), so the
+# hub's native threadpool is used instead of a ThreadPoolExecutor.
+try:
+    from gevent import monkey as _gevent_monkey
+except ImportError:
+    _gevent_monkey = None
+
+if _gevent_monkey is not None and _gevent_monkey.is_module_patched('threading'):
+    from gevent import get_hub
+
+    def _run_off_thread(func, *args):
+        return get_hub().threadpool.apply(func, args)
+else:
+    _bcrypt_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='bcrypt')
+
+    def _run_off_thread(func, *args):
+        return _bcrypt_pool.submit(func, *args).result()
+
+def _hash_password(password):
+    """Hashes a password off the request thread using the configured work factor."""
+    salt = bcrypt.gensalt(rounds=current_app.config['BCRYPT_ROUNDS'])
+    return _run_off_thread(bcrypt.hashpw, password.encode('utf-8'), salt)
+
+def _check_password(password, stored_hash):
+    """Verifies a password against its stored bcrypt hash off the request thread."""
+    return _run_off_thread(bcrypt.checkpw, password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+# Guest name characters as a byte table, built once at import instead of on every call
+_GUEST_ALPHABET = (string.ascii_letters + string.digits).encode()
+_GUEST_ALPHABET_LEN = len(_GUEST_ALPHABET)
+# Random bytes at or above this value are dropped so every character is equally likely
+_GUEST_BYTE_LIMIT = 256 - 256 % _GUEST_ALPHABET_LEN
+_GUEST_NAME_LENGTH = 8
+
 # Internal helper to generate a random guest username
 def _generate_guest_username():
     """Creates a randomized guest username with 8 alphanumeric characters."""
-    letters = string.ascii_letters + string.digits
-    return 'Guest_' + ''.join(random.choice(letters) for i in range(8))
+    # Bytes are drawn from os.urandom (CSPRNG) and mapped through the byte table;
+    # if rejected bytes leave fewer than 8 characters, another draw is made
+    name = bytearray()
+    while len(name) < _GUEST_NAME_LENGTH:
+        random_bytes = os.urandom(_GUEST_NAME_LENGTH)
+        unbiased = [b for b in random_bytes if b < _GUEST_BYTE_LIMIT]
+        name.extend(_GUEST_ALPHABET[b % _GUEST_ALPHABET_LEN] for b in unbiased)
+    return 'Guest_' + name[:_GUEST_NAME_LENGTH].decode()
 
 
 @user_bp.route('/signup', methods=['POST'])
@@ -24,23 +71,25 @@ def signup():
     if not username or not password:
         return jsonify({"message": "Username and password required"}), 400
 
-    # Check if username already exists
-    if db_service.find_user_by_username(username):
-        return jsonify({"message": "Username already taken"}), 409
-
     # Hash the password and store the user
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    password_hash = _hash_password(password)
 
     try:
-        user_id = db_service.insert_user(
+        user_id = db_service.insert_user_if_absent(
             username=username, 
-            password_hash=password_hash.decode('utf-8'), 
-            is_guest=False
+            password_hash=password_hash.decode('utf-8')
         )
+        # No document was inserted, so the username already exists
+        if user_id is None:
+            return jsonify({"message": "Username already taken"}), 409
+
         return jsonify({
             "message": "User created successfully", 
             "user_id": str(user_id)
         }), 201
+    except DuplicateKeyError:
+        # Two concurrent upserts for the same name: the unique index rejects the loser
+        return jsonify({"message": "Username already taken"}), 409
     except Exception as e:
         print(f"Error during sign up: {e}")
         return jsonify({"message": "Internal server error"}), 500
@@ -78,7 +127,7 @@ def login():
         return jsonify({"message": "Username and password required"}), 400
 
     # Look up user by username
-    user = db_service.find_user_by_username(username)
+    user = db_service.find_user_by_username(username, projection=LOGIN_PROJECTION)
 
     if user:
         # Block login for guest accounts
@@ -86,9 +135,7 @@ def login():
             return jsonify({"message": "Guest accounts cannot log in this way. Please use the 'Play as Guest' button."}), 403
             
         # Validate password
-        stored_hash = user.get('password_hash').encode('utf-8')
-        
-        if bcrypt.checkpw(password.encode('utf-8'), stored_hash):
+        if _check_password(password, user.get('password_hash')):
             return jsonify({
                 "message": "Login successful",
                 "user_id": str(user.get('_id')),
@@ -1,28 +1,46 @@
 import pymongo
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
 import datetime
+import secrets
 import sys
 from .. import config
 # for converting the user_id string to a MongoDB object type.
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 
-# Global variables to hold the connected objects
-client = None
-db = None
-user_collection = None
-game_collection = None
+# Per-operation tuning: signups must survive a primary failover and the
+# leaderboard may be read slightly stale.
+# Game records deliberately trade durability for latency: w=1 acknowledges once
+# the primary has the write, weaker than the w="majority" default on MongoDB 5.0+
+# replica sets (including Atlas). A failover can roll such a record back after
+# its game was already removed from ActiveGames, which is accepted for scores.
+SIGNUP_WRITE_CONCERN = WriteConcern(w="majority")
+GAME_HISTORY_WRITE_CONCERN = WriteConcern(w=1, j=False)
+LEADERBOARD_READ_PREFERENCE = pymongo.ReadPreference.SECONDARY_PREFERRED
+LEADERBOARD_READ_CONCERN = ReadConcern("available")
 
-# --- Helper Function to Set Up TTL Index ---
-def _create_ttl_index():
+class _DB:
+    """Holds the process-wide MongoClient and collection handles, set once by init_db()."""
+    client = None
+    db = None
+    users = None
+    games = None
+    active_games = None
+
+# --- Helper Function to Set Up Indexes ---
+def _create_indexes():
     """
     Creates a partial Time-To-Live (TTL) index on the Users collection.
     This ensures guest documents are automatically deleted after inactivity.
+    Also creates a unique index on Users.username (fast lookups, no duplicate
+    accounts), indexes on Game_History for the leaderboard sort and per-user
+    queries, and a TTL index on ActiveGames so abandoned games expire.
     """
-    global user_collection
-    
     try:
         #flags teh users log of the game, if the user exceeds inactivity threshold
         #defined by gust ttl seconds
-        user_collection.create_index(
+        _DB.users.create_index(
             [("last_activity", pymongo.ASCENDING)],
             expireAfterSeconds=config.GUEST_TTL_SECONDS,
             partialFilterExpression={"is_guest": True}
@@ -34,18 +52,56 @@ def _create_ttl_index():
         # This handles cases where the index might already exist or a configuration error occurred.
         print(f"Warning: Could not create TTL index. Error: {e}")
 
+    try:
+        # Backs every login/signup lookup and rejects duplicate usernames at the database level
+        _DB.users.create_index([("username", pymongo.ASCENDING)], unique=True)
+        print("Database Setup: Unique index on 'Users.username' created successfully.")
+    except Exception as e:
+        print(f"Warning: Could not create username index. Error: {e}")
+
+    try:
+        # Matches the leaderboard sort exactly, so sort+limit reads only the top N index entries
+        _DB.games.create_index(
+            [("attempts_taken", pymongo.ASCENDING), ("finished_at", pymongo.ASCENDING)]
+        )
+        # Supports per-user game history lookups
+        _DB.games.create_index([("user_id", pymongo.ASCENDING)])
+        print("Database Setup: Leaderboard and user indexes on 'Game_History' created successfully.")
+    except Exception as e:
+        print(f"Warning: Could not create Game_History indexes. Error: {e}")
+
+    try:
+        # Abandoned games are cleaned up the same way as idle guests
+        _DB.active_games.create_index(
+            [("started_at", pymongo.ASCENDING)],
+            expireAfterSeconds=config.GAME_TTL_SECONDS
+        )
+        print("Database Setup: TTL Index on 'ActiveGames' collection created successfully. (Stale game cleanup enabled)")
+    except Exception as e:
+        print(f"Warning: Could not create ActiveGames TTL index. Error: {e}")
+
 # --- Main Database Initialization Function ---
 def init_db():
     """
-    Initializes the MongoDB connection and global collection references.
+    Initializes the MongoDB connection and the collection handles on _DB.
     This function should be called once when the backend application starts.
     """
-    global client, db, user_collection, game_collection
+    # A single MongoClient (and its connection pool) is shared per process
+    if _DB.client is not None:
+        return
     
     # 1. Establish Connection
     try:
-        # Use MongoClient and the URI from the config file
-        client = pymongo.MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+        # Use MongoClient and the URI from the config file, with an explicitly sized pool
+        client = pymongo.MongoClient(
+            config.MONGO_URI,
+            maxPoolSize=config.MONGO_MAX_POOL_SIZE,
+            minPoolSize=config.MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=config.MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=5000,
+            retryWrites=True
+        )
         
         # Check connection status
         client.admin.command('ismaster')
@@ -63,29 +119,51 @@ def init_db():
         
     # 2. Access Database and Collections
     db = client[config.DB_NAME]
-    user_collection = db.Users
-    game_collection = db.Game_History
+    _DB.client = client
+    _DB.db = db
+    _DB.users = db.Users
+    _DB.games = db.Game_History
+    _DB.active_games = db.ActiveGames
     
     # 3. Perform Initial Setup (Create Indexes)
-    _create_ttl_index()
+    _create_indexes()
 
 # --- CORE CRUD FUNCTIONS ---
 
 
-def find_user_by_username(username : str) -> dict|None:           
+def find_user_by_username(username : str, projection: dict|None = None) -> dict|None:           
     """
     Retrieves a single user's Metadata based on the username.
+
+    Args:
+        projection (dict, optional): fields to return; None returns the whole document.
     
     Returns:
         dict or None: ditionary containing user meta data or returns None
     """
-    global user_collection
-    
     # Use find_one() for efficient retrieval of a single document
-    user_data = user_collection.find_one({"username": username})
+    user_data = _DB.users.find_one({"username": username}, projection)
     
     return user_data
 
+def is_valid_user_id(user_id) -> bool:
+    """Checks that a client-supplied user ID is an ObjectId string (and not, e.g., a query operator)."""
+    return isinstance(user_id, str) and ObjectId.is_valid(user_id)
+
+def find_user_by_id(user_id: str) -> dict|None:
+    """
+    Retrieves the username and guest flag for a user ID string.
+
+    Returns:
+        dict or None: user name/guest data, or None if the ID is invalid or unknown
+    """
+    try:
+        object_id = ObjectId(user_id)
+    except (InvalidId, TypeError):
+        return None
+
+    return _DB.users.find_one({"_id": object_id}, {"username": 1, "is_guest": 1})
+
 # --- NEW FUNCTION FOR CREATE OPERATION ---
 def insert_user(username, password_hash, is_guest):
     """
@@ -98,97 +176,227 @@ def insert_user(username, password_hash, is_guest):
         
     Returns:
         ObjectId: The _id of the newly created document.
+
+    Raises:
+        pymongo.errors.DuplicateKeyError: If the username is already taken.
     """
-    global user_collection
-    
+    # One timezone-aware timestamp shared by created_at and last_activity
+    now = datetime.datetime.now(datetime.timezone.utc)
+
     # 1. Build the base document
     user_document = {
         "username": username,
         "is_guest": is_guest,
-        "created_at": datetime.datetime.utcnow() 
+        "created_at": now
     }
     
     # 2. Add fields specific to guests or signed-up users
     if is_guest:
         # Crucial for the TTL index: add the last_activity timestamp for guests
-        user_document["last_activity"] = datetime.datetime.utcnow()
+        user_document["last_activity"] = now
     else:
         # For signed-up users, store the hashed password
         user_document["password_hash"] = password_hash
         
     # 3. Perform the Create operation (C in CRUD)
-    result = user_collection.insert_one(user_document)
+    result = _DB.users.insert_one(user_document)
     
     # Return the unique MongoDB ID (required by the user_routes.py logic)
     return result.inserted_id
 
-def save_game_history(user_id, attempts, min_range, max_range, target_number):
+def insert_user_if_absent(username, password_hash):
+    """
+    Creates a signed-up user only if the username is not already taken.
+    Uses an upsert with $setOnInsert, so the existence check and the insert
+    happen in a single atomic round trip.
+
+    Args:
+        username (str): The requested username.
+        password_hash (str): Hashed password for the new user.
+
+    Returns:
+        ObjectId or None: The _id of the new document, or None if the username exists.
+    """
+    result = _DB.users.with_options(write_concern=SIGNUP_WRITE_CONCERN).update_one(
+        {"username": username},
+        {"$setOnInsert": {
+            "username": username,
+            "is_guest": False,
+            "password_hash": password_hash,
+            "created_at": datetime.datetime.now(datetime.timezone.utc)
+        }},
+        upsert=True
+    )
+
+    return result.upserted_id
+
+def save_game_history(user_id, username, is_guest, attempts, min_range, max_range, target_number):
     """
     Saves the record of a completed game session to the Game_History collection.
+    The username and guest flag are copied into the record so the leaderboard
+    does not need to join against Users.
     
     Args:
         user_id (str): ID of the user (must be converted to ObjectId).
+        username (str): Name of the user at the time the game was played.
+        is_guest (bool): Whether the player was a guest.
         attempts (int): Number of guesses taken.
         min_range (int), max_range (int): The range used for the game.
         target_number (int): The number the user was guessing.
 
+    Guests also get their last_activity refreshed, so the TTL index only
+    removes guests that have stopped playing.
+
     Returns:
         ObjectId: The ID of the inserted game record.
     """
-    global game_collection
-    
     # Convert user_id string back to ObjectId for database referencing
+    user_object_id = ObjectId(user_id)
     game_record = {
-        "user_id": ObjectId(user_id),
+        "user_id": user_object_id,
+        "username": username,
+        "is_guest": is_guest,
         "attempts_taken": attempts,
         "score_points": 1,  # Based on your plan, 1 point per win
         "range_min": min_range,
         "range_max": max_range,
         "target_number": target_number,
         "game_won": True,
-        "finished_at": datetime.datetime.utcnow()
+        "finished_at": datetime.datetime.now(datetime.timezone.utc)
     }
-    
-    result = game_collection.insert_one(game_record)
+
+    result = _DB.games.with_options(write_concern=GAME_HISTORY_WRITE_CONCERN).insert_one(game_record)
+
+    # Keep active guests alive; registered users have no TTL so need no extra write
+    if is_guest:
+        _DB.users.update_one(
+            {"_id": user_object_id, "is_guest": True},
+            {"$currentDate": {"last_activity": True}}
+        )
+
     return result.inserted_id
+
+def backfill_game_history_usernames():
+    """
+    Copies username/is_guest from Users onto Game_History records saved before
+    those fields were stored with each game. Safe to run repeatedly: only
+    records still missing a username are touched. Records whose user no longer
+    exists (expired guests) cannot be resolved and are left as they are.
+
+    Returns:
+        int: number of records still missing a username afterwards.
+    """
+    _DB.games.aggregate([
+        { "$match": { "username": { "$exists": False } } },
+        {
+            "$lookup": {
+                "from": "Users",
+                "localField": "user_id",
+                "foreignField": "_id",
+                "as": "user_info"
+            }
+        },
+        { "$unwind": "$user_info" },
+        {
+            "$project": {
+                "username": "$user_info.username",
+                "is_guest": "$user_info.is_guest"
+            }
+        },
+        # Write the two fields back onto the matching game records (server-side, one pass)
+        {
+            "$merge": {
+                "into": "Game_History",
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }
+        }
+    ])
+
+    return _DB.games.count_documents({"username": {"$exists": False}})
+
+# --- ACTIVE GAME STATE ---
+# Game state lives in MongoDB (not in process memory) so any worker can serve any guess.
+
+def start_active_game(user_id, username, is_guest, min_range, max_range):
+    """
+    Creates (or replaces) the in-progress game for a user.
+    The document is keyed by user_id so every lookup is a single _id match.
+    The username and guest flag are kept with the game for the history record.
+    The secret number is drawn from the OS CSPRNG and only ever lives in this document.
+    """
+    secret_number = secrets.randbelow(max_range - min_range + 1) + min_range
+
+    _DB.active_games.replace_one(
+        {"_id": user_id},
+        {
+            "username": username,
+            "is_guest": is_guest,
+            "secret_number": secret_number,
+            "attempts": 0,
+            "min_range": min_range,
+            "max_range": max_range,
+            "started_at": datetime.datetime.now(datetime.timezone.utc)
+        },
+        upsert=True
+    )
+
+def record_guess(user_id):
+    """
+    Atomically increments the attempt counter of a user's active game.
+
+    Returns:
+        dict or None: the updated game state, or None if no game is active.
+    """
+    return _DB.active_games.find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"attempts": 1}},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+
+def claim_won_game(user_id, started_at):
+    """
+    Atomically removes a user's active game once it is won.
+    Matching on started_at ensures only this exact game is removed (not a newer
+    one), and only one of several concurrent winning guesses can claim it.
+
+    Returns:
+        dict or None: the removed game state, or None if it was already claimed.
+    """
+    return _DB.active_games.find_one_and_delete({"_id": user_id, "started_at": started_at})
+
 # backend/services/db_service.py (Add this function to the CRUD section)
 
-def get_leaderboard(limit=10):
+def get_leaderboard(limit=10, read_primary=False):
     """
     Retrieves the top N best scores (lowest attempts) using MongoDB Aggregation.
-    Joins Game_History records with the associated User documents.
+    Game_History records carry the player's username, so no join is needed.
+    Scores of guests whose account has since expired stay on the board under
+    the stored guest name; only old records with no username (never backfilled
+    because their user is gone) are skipped.
+
+    Args:
+        read_primary (bool): read from the primary, e.g. right after a write
+            that must be visible; otherwise a secondary may answer.
     """
-    global game_collection
-    
     # Define the Aggregation Pipeline
     pipeline = [
-        # 1. Sort: Find the best scores first (ascending attempts_taken)
+        # 1. Match: Skip legacy records without a username (see backfill_game_history_usernames)
+        { "$match": { "username": { "$exists": True } } },
+
+        # 2. Sort: Find the best scores first (ascending attempts_taken)
         { "$sort": { "attempts_taken": 1, "finished_at": 1 } },
         
-        # 2. Limit: Take only the top N scores (e.g., top 10)
+        # 3. Limit: Take only the top N scores (e.g., top 10)
         { "$limit": limit },
         
-        # 3. Lookup (Join): Fetch the user details from the 'Users' collection
-        #    This connects the game score (user_id) to the user's name.
-        {
-            "$lookup": {
-                "from": "Users",           # The collection to join with
-                "localField": "user_id",   # Field from the Game_History collection
-                "foreignField": "_id",     # Field from the Users collection
-                "as": "user_info"          # Output array name for the joined documents
-            }
-        },
-        
-        # 4. Unwind: Deconstruct the user_info array (created by $lookup)
-        #    We assume only one user matches the ID, so we flatten the array.
-        { "$unwind": "$user_info" },
-        
-        # 5. Project: Shape the final output, including the username
+        # 4. Project: Shape the final output (username is stored on the game record)
         {
             "$project": {
                 "_id": 0,                     # Exclude the internal game _id
-                "username": "$user_info.username", # Pull the username from the joined data
-                "is_guest": "$user_info.is_guest", # Check if player was a guest
+                "username": 1,
+                "is_guest": 1,
                 "attempts_taken": 1,
                 "range_min": 1,
                 "range_max": 1,
@@ -197,6 +405,14 @@ def get_leaderboard(limit=10):
         }
     ]
     
+    # Secondaries may serve this read, keeping the primary free for writes
+    leaderboard_source = _DB.games
+    if not read_primary:
+        leaderboard_source = _DB.games.with_options(
+            read_preference=LEADERBOARD_READ_PREFERENCE,
+            read_concern=LEADERBOARD_READ_CONCERN
+        )
+
     # Execute the pipeline and convert the cursor results to a list
-    leaderboard_data = list(game_collection.aggregate(pipeline))
+    leaderboard_data = list(leaderboard_source.aggregate(pipeline))
     return leaderboard_data
\ No newline at end of file